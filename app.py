@@ -1,19 +1,36 @@
 """
 Interactive AI Storytelling Web Game — Flask backend with Gemini.
 """
-import json
+import hashlib
+import importlib.util
 import logging
 import os
+import random
 import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, render_template, request, stream_with_context
+
+try:
+    import httpx
+    from google import genai
+    from google.genai import types
+except ImportError:  # surfaced on first use by get_client()
+    httpx = genai = types = None
 
 load_dotenv()
 
 # Logging: show in console; level INFO in prod, DEBUG when Flask debug is on
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
 )
@@ -23,22 +40,129 @@ app = Flask(__name__)
 
 # Prefer a model with free-tier quota (2.0-flash often has limit 0 on free tier)
 GEMINI_MODEL = "gemini-2.5-flash"
+# Smaller model with its own quota; used straight away when GEMINI_MODEL is rate limited.
+GEMINI_FALLBACK_MODEL = "gemini-2.0-flash-lite"
+
+# Client-side throttle so bursts queue briefly here instead of tripping Gemini's 429.
+# Per process: with several gunicorn workers, divide the tier's RPM between them.
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "10"))
+# Longest a request waits for a throttle slot before failing fast with 503.
+RATE_LIMIT_WAIT = 20.0
+# Attempts per call when Gemini still answers 429 (each already tries the fallback model).
+MAX_ATTEMPTS = 3
+
+# Character suggestions are cheap, so a slow one is raced against a duplicate after this many seconds.
+SUGGEST_HEDGE_AFTER = 5.0
+
+# Shared Gemini client; built once on first use so its HTTP connection pool is reused.
+# HTTP/2 (when the optional h2 package is installed) multiplexes concurrent calls over one
+# TLS connection; the pool is sized above the gunicorn thread count.
+GEMINI_TIMEOUT_MS = 60_000
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+if not os.environ.get("GEMINI_API_KEY"):
+    logger.warning("GEMINI_API_KEY is not set; story endpoints will fail until it is configured.")
 
 
 def get_client():
-    """Return a configured Gemini client (lazy init to avoid missing key at import)."""
-    from google import genai
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY environment variable is not set")
-    return genai.Client(api_key=api_key)
+    """Return the shared Gemini client (lazy init to avoid missing key at import)."""
+    global _CLIENT
+    if _CLIENT is not None:
+        return _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            if genai is None:
+                raise RuntimeError("google-genai is not installed")
+            api_key = os.environ.get("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY environment variable is not set")
+            _CLIENT = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(
+                    timeout=GEMINI_TIMEOUT_MS,
+                    client_args={
+                        "http2": _HTTP2,
+                        "limits": httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                    },
+                ),
+            )
+    return _CLIENT
+
+
+# JSON object carrying "name" and "personality" inside a possibly chatty model reply.
+_CHAR_JSON_RE = re.compile(r"\{[^{}]*\"name\"[^{}]*\"personality\"[^{}]*\}", re.DOTALL | re.IGNORECASE)
+
+# Responses for identical prompts (same model, genre, hint, prompt and schema) are served from
+# memory. Only GEMINI_MODEL replies are stored, never a fallback-model stand-in.
+_RESPONSE_CACHE = TTLCache(maxsize=1024, ttl=3600)
+_RESPONSE_CACHE_LOCK = threading.RLock()
+
+
+def _cache_key(genre: str, system_hint: str, user_prompt: str, response_schema: dict | None) -> str:
+    """Short stable key for the response cache."""
+    schema = orjson.dumps(response_schema, option=orjson.OPT_SORT_KEYS).decode()
+    raw = f"{GEMINI_MODEL}|{genre}|{system_hint}|{user_prompt}|{schema}".encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+# Runs primary/backup calls for hedged requests (see _call_hedged). Every gunicorn thread may
+# have a primary and a backup in flight, so size it so neither queues behind the other.
+_HEDGE_POOL = ThreadPoolExecutor(
+    max_workers=2 * int(os.environ.get("GUNICORN_THREADS", "16")),
+    thread_name_prefix="gemini-hedge",
+)
+
+
+# Static framing sent as Gemini's system instruction; only the genre and hint vary.
+_PROMPT_PREFIX = "You are a narrative engine for an interactive story. Genre: {genre}. {hint}"
+_CONTINUE_INSTRUCTION = (
+    "Write the next narrative segment (2–4 sentences) that results from the player action below. "
+    "Then briefly describe the new situation so the player can choose another action."
+)
+
+# Structured-output schemas: Gemini replies with JSON matching these, so no text scraping.
+_CHARACTER_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "personality": {"type": "STRING"},
+    },
+    "required": ["name", "personality"],
+}
+# /api/new-game: character and opening scene in one reply.
+_NEW_GAME_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "name": {"type": "STRING"},
+        "personality": {"type": "STRING"},
+        "opening": {"type": "STRING"},
+    },
+    "required": ["name", "personality", "opening"],
+}
+
 
+def _gen_config(genre: str, system_hint: str, response_schema: dict | None = None):
+    """GenerateContentConfig with the static framing as system instruction.
 
-def _call_gemini(client, full_prompt: str) -> str:
+    The framing forms a byte-identical prefix across calls, which is what Gemini's
+    implicit context cache keys on. With response_schema, Gemini must reply with JSON
+    matching it.
+    """
+    return types.GenerateContentConfig(
+        system_instruction=_PROMPT_PREFIX.format(genre=genre, hint=system_hint).rstrip(),
+        response_mime_type="application/json" if response_schema else None,
+        response_schema=response_schema,
+    )
+
+
+def _call_gemini(client, config, user_prompt: str, model: str = GEMINI_MODEL) -> str:
     """One Gemini generate_content call. Returns response text or raises."""
     response = client.models.generate_content(
-        model=GEMINI_MODEL,
-        contents=full_prompt,
+        model=model,
+        contents=user_prompt,
+        config=config,
     )
     if response and getattr(response, "text", None):
         return response.text.strip()
@@ -46,50 +170,432 @@ def _call_gemini(client, full_prompt: str) -> str:
     return ""
 
 
+def _stream_gemini(client, config, user_prompt: str, model: str = GEMINI_MODEL):
+    """Streaming variant of _call_gemini: yields text chunks as they arrive."""
+    for chunk in client.models.generate_content_stream(
+        model=model,
+        contents=user_prompt,
+        config=config,
+    ):
+        if chunk.text:
+            yield chunk.text
+
+
 def _is_rate_limit(err: Exception) -> bool:
     """True if the exception is a 429 / quota exhausted error."""
     msg = str(err).upper()
     return "429" in msg or "RESOURCE_EXHAUSTED" in msg or "QUOTA" in msg
 
 
-def generate(genre: str, user_prompt: str, system_hint: str = "") -> str:
-    """Single helper for all Gemini calls. Builds prompt with genre and returns model text."""
-    import time
+class TokenBucket:
+    """Thread-safe token bucket refilling per_minute tokens a minute, bursting up to per_minute."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, sleeping for the refill if needed. False if that would exceed timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                delay = (1 - self.tokens) / self.rate
+            if now + delay > deadline:
+                return False
+            time.sleep(delay)
+
+
+_RATE_LIMITER = TokenBucket(GEMINI_RPM)
+
+
+class LocalRateLimitError(Exception):
+    """No rate-limiter slot freed up within RATE_LIMIT_WAIT; expected under load."""
+
+
+def _throttle() -> None:
+    """Wait for a rate-limiter slot or raise so the caller can answer 503 promptly."""
+    if not _RATE_LIMITER.acquire(timeout=RATE_LIMIT_WAIT):
+        raise LocalRateLimitError(f"Local rate limit ({GEMINI_RPM}/min) reached")
+
+
+def _call_with_fallback(client, config, user_prompt: str) -> tuple[str, str]:
+    """Call GEMINI_MODEL; on rate limit, retry at once on GEMINI_FALLBACK_MODEL instead of waiting.
+
+    Returns (text, model that answered).
+    """
+    try:
+        return _call_gemini(client, config, user_prompt), GEMINI_MODEL
+    except Exception as err:
+        if not _is_rate_limit(err):
+            raise
+        logger.warning("Rate limit (429) on %s; retrying on %s.", GEMINI_MODEL, GEMINI_FALLBACK_MODEL)
+        return _call_gemini(client, config, user_prompt, model=GEMINI_FALLBACK_MODEL), GEMINI_FALLBACK_MODEL
+
+
+def _call_with_retry(client, config, user_prompt: str, has_token: bool = False) -> tuple[str, str]:
+    """Throttled _call_with_fallback; if both models are rate limited, back off with jitter and retry.
+
+    has_token means the caller already took the rate-limiter slot for the first attempt.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt or not has_token:
+            _throttle()
+        try:
+            return _call_with_fallback(client, config, user_prompt)
+        except Exception as err:
+            if not _is_rate_limit(err) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = min(2**attempt + random.random(), 30)
+            logger.warning("Rate limit (429) on both models; retrying in %.1fs.", delay)
+            time.sleep(delay)
+
+
+def _call_hedged(client, config, user_prompt: str, hedge_after: float) -> tuple[str, str]:
+    """Send a backup request if the first has not answered within hedge_after seconds.
+
+    The clock starts once the primary holds a rate-limiter slot, and the backup is only sent
+    if a slot is free right away, so time queued locally or a short quota never triggers it.
+    Returns whichever succeeds first; raises the last error only if both fail.
+    """
+    _throttle()
+    primary = _HEDGE_POOL.submit(_call_with_retry, client, config, user_prompt, True)
+    done, _ = wait([primary], timeout=hedge_after)
+    if done:
+        return primary.result()
+    if not _RATE_LIMITER.acquire(timeout=0):
+        logger.info("Gemini slower than %.1fs but no rate-limit slot free; not hedging.", hedge_after)
+        return primary.result()
+    logger.info("Gemini slower than %.1fs; sending hedge request.", hedge_after)
+    backup = _HEDGE_POOL.submit(_call_with_retry, client, config, user_prompt, True)
+    pending = {primary, backup}
+    last_err = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            if fut.exception() is None:
+                # Only stops a call still queued; one already sent to Gemini runs to completion
+                for other in pending:
+                    other.cancel()
+                return fut.result()
+            last_err = fut.exception()
+    raise last_err
+
+
+def generate(
+    genre: str,
+    user_prompt: str,
+    system_hint: str = "",
+    cache: bool = True,
+    hedge_after: float | None = None,
+    response_schema: dict | None = None,
+    validate: Callable[[str], bool] | None = None,
+) -> str:
+    """Single helper for all Gemini calls. Builds prompt with genre and returns model text.
+
+    Identical prompts are answered from the in-process response cache unless cache=False;
+    with validate set, only text it accepts is stored, so one bad reply is not replayed.
+    With hedge_after set, a duplicate request is raced against a slow first one.
+    With response_schema set, the text should be JSON matching that schema.
+    """
+    key = _cache_key(genre, system_hint, user_prompt, response_schema) if cache else None
+    if key is not None:
+        with _RESPONSE_CACHE_LOCK:
+            cached = _RESPONSE_CACHE.get(key)
+        if cached is not None:
+            logger.debug("Response cache hit genre=%s", genre)
+            return cached
+    text, model = _generate_uncached(genre, user_prompt, system_hint, hedge_after, response_schema)
+    if key is not None and text and model == GEMINI_MODEL and (validate is None or validate(text)):
+        with _RESPONSE_CACHE_LOCK:
+            _RESPONSE_CACHE[key] = text
+    return text
+
+
+def _generate_uncached(
+    genre: str,
+    user_prompt: str,
+    system_hint: str,
+    hedge_after: float | None,
+    response_schema: dict | None,
+) -> tuple[str, str]:
+    """Call Gemini for one prompt, falling back to the smaller model on rate limit.
+
+    Returns (text, model that answered).
+    """
     try:
         client = get_client()
-        full_prompt = (
-            f"You are a narrative engine for an interactive story. Genre: {genre}. "
-            f"{system_hint}\n\n{user_prompt}"
-        )
-        logger.debug("Calling Gemini model=%s genre=%s prompt_len=%d", GEMINI_MODEL, genre, len(full_prompt))
+        config = _gen_config(genre, system_hint, response_schema)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Calling Gemini model=%s genre=%s prompt_len=%d", GEMINI_MODEL, genre, len(user_prompt))
+        if hedge_after is not None:
+            return _call_hedged(client, config, user_prompt, hedge_after)
+        return _call_with_retry(client, config, user_prompt)
+    except LocalRateLimitError as e:
+        logger.warning("Story engine throttled: %s", e)
+        raise RuntimeError(f"Story engine error: {e}") from e
+    except Exception as e:
+        logger.exception("Story engine (Gemini) error: %s", e)
+        raise RuntimeError(f"Story engine error: {e}") from e
+
+
+def _strip_fence(text: str) -> str:
+    """text without surrounding whitespace or a markdown ```json fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+    return text
+
+
+def json_object(text: str) -> dict | None:
+    """text (optionally fenced) parsed as a JSON object, or None if it is not one (e.g. truncated)."""
+    try:
+        obj = orjson.loads(_strip_fence(text))
+    except orjson.JSONDecodeError:
+        return None
+    return obj if isinstance(obj, dict) else None
+
+
+def _is_json_object(text: str) -> bool:
+    """Cache validator for structured replies."""
+    return json_object(text) is not None
+
+
+def generate_stream(genre: str, user_prompt: str, system_hint: str = ""):
+    """Like generate(), but yields the model text in chunks as Gemini produces it. Never cached.
+
+    The fallback model is only tried if the rate limit hits before anything was sent.
+    """
+    try:
+        client = get_client()
+        config = _gen_config(genre, system_hint)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Streaming Gemini model=%s genre=%s prompt_len=%d", GEMINI_MODEL, genre, len(user_prompt))
+        _throttle()
+        started = False
         try:
-            return _call_gemini(client, full_prompt)
-        except Exception as first_err:
-            if _is_rate_limit(first_err):
-                wait_sec = 45
-                logger.warning("Rate limit (429) hit; waiting %ds then retrying once.", wait_sec)
-                time.sleep(wait_sec)
-                return _call_gemini(client, full_prompt)
-            raise
+            for text in _stream_gemini(client, config, user_prompt):
+                started = True
+                yield text
+        except Exception as err:
+            if started or not _is_rate_limit(err):
+                raise
+            logger.warning("Rate limit (429) on %s; retrying on %s.", GEMINI_MODEL, GEMINI_FALLBACK_MODEL)
+            yield from _stream_gemini(client, config, user_prompt, model=GEMINI_FALLBACK_MODEL)
+    except LocalRateLimitError as e:
+        logger.warning("Story engine throttled: %s", e)
+        raise RuntimeError(f"Story engine error: {e}") from e
     except Exception as e:
         logger.exception("Story engine (Gemini) error: %s", e)
         raise RuntimeError(f"Story engine error: {e}") from e
 
 
+# Per-session story state lives in SQLite so any worker can serve any turn and the client
+# only sends its new action. Prompts stay bounded as the story grows: the last STORY_WINDOW
+# segments are sent verbatim, anything older only as a rolling summary.
+STORY_DB_PATH = os.environ.get("STORY_DB_PATH", "sessions.db")
+STORY_WINDOW = 6
+# Sessions untouched for this long are deleted whenever a session is created or (re)started.
+SESSION_MAX_AGE_DAYS = float(os.environ.get("SESSION_MAX_AGE_DAYS", "7"))
+_SESSIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    theme TEXT NOT NULL,
+    character_json TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    recent_segments_json TEXT NOT NULL DEFAULT '[]',
+    updated_at REAL NOT NULL
+)
+"""
+_SESSIONS_INDEX = "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+_DB_LOCAL = threading.local()
+# Summaries run off the request path; evicted segments stay in the prompt until theirs is ready.
+_SUMMARY_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="story-summary")
+_SUMMARIZING = set()
+_SUMMARIZING_LOCK = threading.Lock()
+
+
+def _db() -> sqlite3.Connection:
+    """Per-thread SQLite connection (autocommit, WAL) to the session store."""
+    conn = getattr(_DB_LOCAL, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(STORY_DB_PATH, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SESSIONS_SCHEMA)
+        conn.execute(_SESSIONS_INDEX)
+        _DB_LOCAL.conn = conn
+    return conn
+
+
+def _prune_sessions(conn: sqlite3.Connection) -> None:
+    """Delete sessions idle for more than SESSION_MAX_AGE_DAYS (an index range scan on updated_at)."""
+    cutoff = time.time() - SESSION_MAX_AGE_DAYS * 86400
+    deleted = conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+    if deleted:
+        logger.info("Pruned %d stale story sessions", deleted)
+
+
+def create_session(theme: str = "adventure", name: str = "Hero", personality: str = "") -> str:
+    """Insert an empty session and return its id."""
+    session_id = uuid.uuid4().hex
+    conn = _db()
+    _prune_sessions(conn)
+    conn.execute(
+        "INSERT INTO sessions (session_id, theme, character_json, updated_at) VALUES (?, ?, ?, ?)",
+        (session_id, theme, orjson.dumps({"name": name, "personality": personality}).decode(), time.time()),
+    )
+    return session_id
+
+
+def start_session(session_id: str, theme: str, name: str, personality: str, opening: str) -> None:
+    """(Re)start a session's story with its character and opening scene."""
+    conn = _db()
+    _prune_sessions(conn)
+    conn.execute(
+        "INSERT INTO sessions (session_id, theme, character_json, summary, recent_segments_json, updated_at) "
+        "VALUES (?, ?, ?, '', ?, ?) ON CONFLICT(session_id) DO UPDATE SET theme = excluded.theme, "
+        "character_json = excluded.character_json, summary = '', "
+        "recent_segments_json = excluded.recent_segments_json, updated_at = excluded.updated_at",
+        (
+            session_id,
+            theme,
+            orjson.dumps({"name": name, "personality": personality}).decode(),
+            orjson.dumps([opening]).decode(),
+            time.time(),
+        ),
+    )
+
+
+def load_session(session_id: str) -> dict | None:
+    """Return { theme, name, personality, summary, recent } for session_id, or None if unknown."""
+    row = _db().execute(
+        "SELECT theme, character_json, summary, recent_segments_json FROM sessions WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    character = orjson.loads(row[1])
+    return {
+        "theme": row[0],
+        "name": character.get("name", "Hero"),
+        "personality": character.get("personality", ""),
+        "summary": row[2],
+        "recent": orjson.loads(row[3]),
+    }
+
+
+def session_story(session: dict) -> str:
+    """Story context for the prompt: rolling summary (if any) then the recent segments."""
+    parts = [f"(Earlier: {session['summary']})"] if session["summary"] else []
+    parts.extend(session["recent"])
+    return "\n\n".join(parts)
+
+
+def append_segment(session_id: str, segment: str) -> None:
+    """Append a segment; once past the window, summarize the oldest half in the background."""
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT theme, summary, recent_segments_json FROM sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+        if row is None:
+            conn.execute("ROLLBACK")
+            return
+        theme, summary, recent = row[0], row[1], orjson.loads(row[2])
+        recent.append(segment)
+        conn.execute(
+            "UPDATE sessions SET recent_segments_json = ?, updated_at = ? WHERE session_id = ?",
+            (orjson.dumps(recent).decode(), time.time(), session_id),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if len(recent) <= STORY_WINDOW:
+        return
+    with _SUMMARIZING_LOCK:
+        if session_id in _SUMMARIZING:
+            return
+        _SUMMARIZING.add(session_id)
+    evicted = recent[: len(recent) - STORY_WINDOW // 2]
+    _SUMMARY_POOL.submit(_summarize_session, session_id, theme, summary, evicted)
+
+
+def _summarize_session(session_id: str, theme: str, summary: str, evicted: list[str]) -> None:
+    """Fold evicted segments into the session's rolling summary and drop them from the window."""
+    try:
+        user_prompt = (
+            "Condense the story events below into a summary of at most 5 sentences, keeping names, places, "
+            "items and unresolved threads. Merge them into the existing summary if there is one.\n\n"
+            f"Existing summary:\n{summary or '(none)'}\n\n"
+            "Events:\n" + "\n\n".join(evicted)
+        )
+        try:
+            new_summary = generate(theme, user_prompt, cache=False)
+        except RuntimeError:
+            return
+        if not new_summary:
+            return
+        conn = _db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT recent_segments_json FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            recent = orjson.loads(row[0]) if row else []
+            # Skip if the story was restarted (or already summarized elsewhere) meanwhile
+            if recent[: len(evicted)] == evicted:
+                conn.execute(
+                    "UPDATE sessions SET summary = ?, recent_segments_json = ?, updated_at = ? WHERE session_id = ?",
+                    (new_summary, orjson.dumps(recent[len(evicted):]).decode(), time.time(), session_id),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except Exception:
+        logger.exception("Story summary failed for session %s", session_id)
+    finally:
+        with _SUMMARIZING_LOCK:
+            _SUMMARIZING.discard(session_id)
+
+
 def parse_character_response(raw: str) -> dict:
-    """Parse Gemini's character reply into {name, personality}. Tolerates markdown and minor variations."""
+    """Parse a free-text character reply into {name, personality}. Tolerates markdown and minor variations.
+
+    Only a fallback now: suggest_character requests structured JSON output.
+    """
     raw = raw.strip()
-    # Try to extract JSON block if present
-    match = re.search(r"\{[^{}]*\"name\"[^{}]*\"personality\"[^{}]*\}", raw, re.DOTALL | re.IGNORECASE)
-    if match:
-        try:
-            obj = json.loads(match.group())
-            return {
-                "name": obj.get("name", "Hero"),
-                "personality": obj.get("personality", "Brave and curious."),
-            }
-        except json.JSONDecodeError:
-            pass
+    # Common case: the reply is bare JSON, possibly inside a ```json fence
+    try:
+        obj = orjson.loads(_strip_fence(raw))
+    except orjson.JSONDecodeError:
+        obj = None
+    if not (isinstance(obj, dict) and "name" in obj):
+        # Otherwise (also a list or a nested object) try to extract the JSON block
+        obj = None
+        match = _CHAR_JSON_RE.search(raw)
+        if match:
+            try:
+                obj = orjson.loads(match.group())
+            except orjson.JSONDecodeError:
+                pass
+    if isinstance(obj, dict):
+        return {
+            "name": obj.get("name", "Hero"),
+            "personality": obj.get("personality", "Brave and curious."),
+        }
     # Fallback: look for "name" and "personality" lines or similar
     name = "Hero"
     personality = raw
@@ -101,12 +607,24 @@ def parse_character_response(raw: str) -> dict:
     return {"name": name, "personality": personality}
 
 
+def _get_str(data: dict, key: str, default: str | None = "") -> str | None:
+    """data[key] stripped, or default when missing, not a string, or blank."""
+    value = data.get(key)
+    value = value.strip() if isinstance(value, str) else ""
+    return value or default
+
+
+def ojsonify(obj, status: int = 200) -> Response:
+    """Like flask.jsonify, but serialized with orjson."""
+    return Response(orjson.dumps(obj), status=status, mimetype="application/json")
+
+
 def error_response(message: str, status: int, detail: str | None = None):
     """JSON error with optional detail for debugging."""
     body = {"error": message}
     if detail is not None:
         body["detail"] = detail
-    return jsonify(body), status
+    return ojsonify(body, status)
 
 
 @app.route("/")
@@ -116,25 +634,111 @@ def index():
 
 @app.route("/api/suggest-character", methods=["POST"])
 def suggest_character():
-    """POST body: { theme } -> { name, personality }."""
+    """POST body: { theme } -> { name, personality }.
+
+    Carries a weak ETag derived from model and theme (any suggestion for the theme is
+    equivalent, even if the text differs); a matching If-None-Match gets a 304 without
+    calling Gemini.
+    """
     try:
         data = request.get_json() or {}
-        theme = (data.get("theme") or "adventure").strip() or "adventure"
+        theme = _get_str(data, "theme", "adventure")
+        etag = hashlib.blake2b(f"{GEMINI_MODEL}|char|{theme}".encode(), digest_size=8).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag, weak=True)
+            return not_modified
         logger.info("suggest_character theme=%r", theme)
-        user_prompt = (
-            f"Given genre: {theme}. Suggest a single protagonist: "
-            'full name and one sentence personality. Reply only with valid JSON: {{"name": "...", "personality": "..."}}.'
+        user_prompt = f"Given genre: {theme}. Suggest a single protagonist: full name and one sentence personality."
+        text = generate(
+            theme,
+            user_prompt,
+            hedge_after=SUGGEST_HEDGE_AFTER,
+            response_schema=_CHARACTER_SCHEMA,
+            validate=_is_json_object,
         )
-        text = generate(theme, user_prompt)
-        result = parse_character_response(text)
-        logger.debug("suggest_character result name=%r", result.get("name"))
-        return jsonify(result)
+        obj = json_object(text)
+        if obj is None and _strip_fence(text).startswith("{"):
+            # Broken structured reply (e.g. truncated): ask once more rather than scrape it
+            logger.warning("suggest_character got malformed JSON; retrying once")
+            text = generate(
+                theme,
+                user_prompt,
+                hedge_after=SUGGEST_HEDGE_AFTER,
+                response_schema=_CHARACTER_SCHEMA,
+                validate=_is_json_object,
+            )
+            obj = json_object(text)
+            if obj is None and _strip_fence(text).startswith("{"):
+                raise RuntimeError(f"Story engine returned invalid JSON: {text[:80]!r}")
+        if obj is not None:
+            result = {
+                "name": obj.get("name") or "Hero",
+                "personality": obj.get("personality") or "Brave and curious.",
+            }
+        else:
+            # Last resort for a non-JSON (free-text) reply; never cached
+            result = parse_character_response(text)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("suggest_character result name=%r", result.get("name"))
+        response = ojsonify(result)
+        if obj is not None:
+            response.set_etag(etag, weak=True)
+            response.cache_control.public = True
+            response.cache_control.max_age = 300
+        return response
     except ValueError as e:
         logger.warning("suggest_character ValueError: %s", e)
         return error_response(str(e), 400)
     except RuntimeError as e:
         detail = str(e)
-        logger.error("suggest_character RuntimeError: %s", detail, exc_info=True)
+        logger.error("suggest_character RuntimeError: %s", detail)
+        return error_response(
+            "Story engine is busy; try again.",
+            503,
+            detail=detail if app.debug else None,
+        )
+
+
+@app.route("/api/new-game", methods=["POST"])
+def new_game():
+    """POST body: { theme, sessionId? } -> { name, personality, opening, sessionId } from one Gemini call.
+
+    Combines suggest-character and start-story; the session (created if not given) is
+    started with the suggested character and opening.
+    """
+    try:
+        data = request.get_json() or {}
+        theme = _get_str(data, "theme", "adventure")
+        logger.info("new_game theme=%r", theme)
+        user_prompt = (
+            f"Given genre: {theme}. Suggest a single protagonist: full name and one sentence personality. "
+            "Then write their opening scene in exactly 2 short paragraphs separated by a blank line: "
+            "(1) a tranquil setting where the character is. (2) A sudden disruption (event or danger). "
+            "No dialogue from the narrator; set the scene only."
+        )
+        # Each call is a new game (Suggest rerolls), so never replay a cached one
+        text = generate(
+            theme,
+            user_prompt,
+            response_schema=_NEW_GAME_SCHEMA,
+            cache=False,
+        )
+        obj = json_object(text)
+        if obj is None:
+            raise RuntimeError(f"Story engine returned invalid JSON: {text[:80]!r}")
+        result = {
+            "name": obj.get("name") or "Hero",
+            "personality": obj.get("personality") or "Brave and curious.",
+            "opening": obj.get("opening") or "Something begins...",
+        }
+        session_id = _get_str(data, "sessionId") or uuid.uuid4().hex
+        start_session(session_id, theme, result["name"], result["personality"], result["opening"])
+        result["sessionId"] = session_id
+        return ojsonify(result)
+    except RuntimeError as e:
+        detail = str(e)
+        logger.error("new_game RuntimeError: %s", detail)
         return error_response(
             "Story engine is busy; try again.",
             503,
@@ -142,25 +746,38 @@ def suggest_character():
         )
 
 
+@app.route("/api/session/new", methods=["POST"])
+def new_session():
+    """POST body: { theme?, characterName?, characterPersonality? } -> { sessionId }."""
+    data = request.get_json(silent=True) or {}
+    theme = _get_str(data, "theme", "adventure")
+    name = _get_str(data, "characterName", "Hero")
+    personality = _get_str(data, "characterPersonality")
+    return ojsonify({"sessionId": create_session(theme, name, personality)})
+
+
 @app.route("/api/start-story", methods=["POST"])
 def start_story():
-    """POST body: { theme, characterName, characterPersonality } -> { opening }."""
+    """POST body: { theme, characterName, characterPersonality, sessionId? } -> { opening }."""
     try:
         data = request.get_json() or {}
-        theme = (data.get("theme") or "adventure").strip() or "adventure"
-        name = (data.get("characterName") or "Hero").strip()
-        personality = (data.get("characterPersonality") or "").strip()
+        theme = _get_str(data, "theme", "adventure")
+        name = _get_str(data, "characterName", "Hero")
+        personality = _get_str(data, "characterPersonality")
         logger.info("start_story theme=%r character=%r", theme, name)
         user_prompt = (
             f"Character: {name}. Personality: {personality}. "
             "Write exactly 2 short paragraphs: (1) a tranquil setting where the character is. "
             "(2) A sudden disruption (event or danger). No dialogue from the narrator; set the scene only."
         )
-        opening = generate(theme, user_prompt)
-        return jsonify({"opening": opening or "Something begins..."})
+        opening = generate(theme, user_prompt) or "Something begins..."
+        session_id = _get_str(data, "sessionId")
+        if session_id:
+            start_session(session_id, theme, name, personality, opening)
+        return ojsonify({"opening": opening})
     except RuntimeError as e:
         detail = str(e)
-        logger.error("start_story RuntimeError: %s", detail, exc_info=True)
+        logger.error("start_story RuntimeError: %s", detail)
         return error_response(
             "Story engine is busy; try again.",
             503,
@@ -168,34 +785,58 @@ def start_story():
         )
 
 
+def _continue_prompt(data: dict) -> tuple[str, str, str, str | None]:
+    """Build (theme, user_prompt, system_hint, session_id) for a continue-story request.
+
+    With a sessionId, theme, character and story come from the session store and the body
+    only needs userAction; without one, the body carries everything. ValueError if no
+    action, LookupError if the session is unknown.
+    """
+    user_action = _get_str(data, "userAction")
+    session_id = _get_str(data, "sessionId", None)
+    if not user_action:
+        raise ValueError("No action provided.")
+    if session_id:
+        session = load_session(session_id)
+        if session is None:
+            raise LookupError("Unknown session; start a new game.")
+        theme, name, personality = session["theme"], session["name"], session["personality"]
+        story_so_far = session_story(session)
+    else:
+        theme = _get_str(data, "theme", "adventure")
+        name = _get_str(data, "characterName", "Hero")
+        personality = _get_str(data, "characterPersonality")
+        story_so_far = _get_str(data, "storySoFar")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("continue_story theme=%r character=%r action=%r", theme, name, user_action[:50])
+    # Fixed instructions first, then the story (which only grows at its end), then the
+    # action, so consecutive turns share the longest possible prompt prefix.
+    user_prompt = "\n\n".join((
+        _CONTINUE_INSTRUCTION,
+        f"Story so far:\n{story_so_far}",
+        f"Player action: {user_action}",
+    ))
+    system_hint = f"Character: {name}. Personality: {personality}. Stay in genre."
+    return theme, user_prompt, system_hint, session_id
+
+
 @app.route("/api/continue-story", methods=["POST"])
 def continue_story():
-    """POST body: { theme, characterName, characterPersonality, storySoFar, userAction } -> { segment }."""
+    """POST body: { sessionId, userAction } or { theme, characterName, characterPersonality, storySoFar, userAction } -> { segment }."""
     try:
         data = request.get_json() or {}
-        theme = (data.get("theme") or "adventure").strip() or "adventure"
-        name = (data.get("characterName") or "Hero").strip()
-        personality = (data.get("characterPersonality") or "").strip()
-        story_so_far = (data.get("storySoFar") or "").strip()
-        user_action = (data.get("userAction") or "").strip()
-        if not user_action:
-            return error_response("No action provided.", 400)
-        logger.info("continue_story theme=%r character=%r action=%r", theme, name, user_action[:50])
-        user_prompt = (
-            f"Story so far:\n{story_so_far}\n\n"
-            f"Player action: {user_action}\n\n"
-            "Write the next narrative segment (2–4 sentences) that results from this action. "
-            "Then briefly describe the new situation so the player can choose another action."
-        )
-        segment = generate(
-            theme,
-            user_prompt,
-            system_hint=f"Character: {name}. Personality: {personality}. Stay in genre.",
-        )
-        return jsonify({"segment": segment or "The story continues..."})
+        theme, user_prompt, system_hint, session_id = _continue_prompt(data)
+        segment = generate(theme, user_prompt, system_hint=system_hint, cache=False) or "The story continues..."
+        if session_id:
+            append_segment(session_id, segment)
+        return ojsonify({"segment": segment})
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except LookupError as e:
+        return error_response(str(e), 404)
     except RuntimeError as e:
         detail = str(e)
-        logger.error("continue_story RuntimeError: %s", detail, exc_info=True)
+        logger.error("continue_story RuntimeError: %s", detail)
         return error_response(
             "Story engine is busy; try again.",
             503,
@@ -203,5 +844,54 @@ def continue_story():
         )
 
 
+def _sse(payload: dict, event: str | None = None) -> bytes:
+    """One server-sent event with a JSON data line."""
+    head = f"event: {event}\n".encode() if event else b""
+    return head + b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+@app.route("/api/continue-story-stream", methods=["POST"])
+def continue_story_stream():
+    """POST body: same as /api/continue-story -> text/event-stream of { text } chunks, then a done (or error) event."""
+    data = request.get_json() or {}
+    try:
+        theme, user_prompt, system_hint, session_id = _continue_prompt(data)
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except LookupError as e:
+        return error_response(str(e), 404)
+
+    def events():
+        chunks = []
+        try:
+            for text in generate_stream(theme, user_prompt, system_hint=system_hint):
+                chunks.append(text)
+                yield _sse({"text": text})
+        except RuntimeError as e:
+            detail = str(e)
+            logger.error("continue_story_stream RuntimeError: %s", detail)
+            body = {"error": "Story engine is busy; try again."}
+            if app.debug:
+                body["detail"] = detail
+            yield _sse(body, event="error")
+            return
+        if session_id:
+            try:
+                append_segment(session_id, "".join(chunks).strip() or "The story continues...")
+            except Exception:
+                # The client must not keep a segment the session does not have
+                logger.exception("continue_story_stream could not store segment for session %s", session_id)
+                yield _sse({"error": "Could not save the story; try again."}, event="error")
+                return
+        yield _sse({}, event="done")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.DEBUG)
     app.run(debug=True, port=5000)
@@ -0,0 +1,15 @@
+"""
+Gunicorn settings for serving the story app: gunicorn app:app
+"""
+import os
+
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Handlers spend seconds waiting on Gemini with the GIL released, so threads scale well.
+# Set GUNICORN_WORKER_CLASS=gevent (pip install gevent) to multiplex many in-flight
+# Gemini calls per worker on cooperative I/O instead of one thread each.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "256"))
+# Gemini calls (plus a rate-limit retry) can take well over gunicorn's 30 s default.
+timeout = 120
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")